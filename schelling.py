@@ -1,20 +1,500 @@
-import os
-import random
-import math
+import sys
+import ctypes
 import platform
+import numpy as np
 import matplotlib.pyplot as plt
-from typing import Tuple, List
+from numba import njit
+from scipy.signal import convolve2d
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple, Optional, List
 from colors import Colors
 
+# integer codes of the cell states stored in the grid
+EMPTY = 0
+AGENT_A = 1
+AGENT_B = 2
+# marks the cells of the padding around the grid, which are neither empty nor agents
+BORDER = 3
+
+# sums up the eight direct neighbors of every cell when convolved with the grid
+NEIGHBOR_KERNEL = np.ones((3, 3), dtype=np.int8)
+NEIGHBOR_KERNEL[1, 1] = 0
+
+# at most how many steps to draw random numbers for and run in compiled code at once
+STEP_BATCH_SIZE = 1024
+
+# in the packed grid each cell takes two bits, which are exactly its integer code.
+# A three by three window packs into 18 bits, six bits per row.
+# the low and the high bit of each of the nine cells of a window
+WINDOW_LOW_BITS = 0x15555
+WINDOW_HIGH_BITS = 0x2AAAA
+# all bits of a window except the ones of the center cell
+WINDOW_NEIGHBOR_BITS = 0x3FCFF
+# packed grids larger than this many bytes, i.e., larger than a typical L2 cache,
+# are stored in tiles of MORTON_TILE_SIZE * MORTON_TILE_SIZE cells in Z-order
+MORTON_MIN_BYTES = 1 << 20
+MORTON_TILE_SIZE = 32
+
+
+# the colored print version of each cell value, indexed by [background, value].
+# agents get different colors and bold font and light grey is used as every second
+# background color in a checkerboard pattern to help visualize the grid
+PRINT_VALUES = [
+    f"   {Colors.reset}",
+    f"{Colors.bold}{Colors.fg.green} A {Colors.reset}",
+    f"{Colors.bold}{Colors.fg.blue} B {Colors.reset}",
+]
+PRINT_TOKENS = np.array(
+    [[f"{Colors.bg.lightgrey}{value}" for value in PRINT_VALUES], PRINT_VALUES],
+    dtype=object,
+)
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """
+    Insert a zero bit before each bit of the given values,
+    i.e., move bit k to bit 2 * k, to interleave two coordinates
+    :param values: non-negative integers below 2 ** 16
+    :return: the values with their bits spread out
+    """
+    spread = np.zeros_like(values, dtype=np.int64)
+    for bit in range(16):
+        spread |= ((values >> bit) & 1) << (2 * bit)
+    return spread
 
-def clear_output():
+
+def get_packed_layout(x_size: int, y_size: int) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Clear the former output to not spam the console
+    Get the index of each cell in the packed grid, which is the sum of the index
+    of its row and of its column. Small grids are stored row by row. Grids that do
+    not fit into the cache are split into tiles, stored in Z-order within each tile,
+    so that the three by three window around a cell mostly lies in one cache line.
+    :param x_size: the number of rows of the padded grid
+    :param y_size: the number of columns of the padded grid
+    :return: a tuple with the index of each row and of each column
     """
-    if platform.system() == "Windows":
-        os.system("cls")
+    rows = np.arange(x_size, dtype=np.int64)
+    columns = np.arange(y_size, dtype=np.int64)
+
+    # row by row, two bits per cell
+    if x_size * y_size // 4 <= MORTON_MIN_BYTES:
+        return rows * y_size, columns
+
+    # tiles of MORTON_TILE_SIZE * MORTON_TILE_SIZE cells, one row of tiles after another,
+    # the bits of the row and column within a tile are interleaved
+    tile_cells = MORTON_TILE_SIZE * MORTON_TILE_SIZE
+    tiles_per_row = -(-y_size // MORTON_TILE_SIZE)
+    row_index = (rows // MORTON_TILE_SIZE) * tiles_per_row * tile_cells + (
+        spread_bits(rows % MORTON_TILE_SIZE) << 1
+    )
+    column_index = (columns // MORTON_TILE_SIZE) * tile_cells + spread_bits(
+        columns % MORTON_TILE_SIZE
+    )
+    return row_index, column_index
+
+
+@njit(cache=True)
+def pack_grid(
+    padded_grid: np.ndarray, row_index: np.ndarray, column_index: np.ndarray
+) -> np.ndarray:
+    """
+    Pack the padded grid into two bits per cell, 32 cells per 64 bit word
+    :param padded_grid: the grid surrounded by a one cell wide border
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :return: a flat array of words
+    """
+    n_cells = row_index[-1] + column_index[-1] + 1
+    packed_grid = np.zeros((n_cells + 31) // 32, dtype=np.uint64)
+    for x in range(padded_grid.shape[0]):
+        for y in range(padded_grid.shape[1]):
+            set_packed_cell(
+                packed_grid, row_index, column_index, x, y, padded_grid[x, y]
+            )
+    return packed_grid
+
+
+@njit(cache=True)
+def unpack_grid(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    padded_grid: np.ndarray,
+):
+    """
+    Write the cells of the packed grid back into the padded grid
+    :param packed_grid: the packed padded grid
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param padded_grid: receives the cells, the grid surrounded by a one cell wide border
+    """
+    for x in range(padded_grid.shape[0]):
+        for y in range(padded_grid.shape[1]):
+            padded_grid[x, y] = get_packed_cell(
+                packed_grid, row_index, column_index, x, y
+            )
+
+
+@njit(cache=True)
+def pack_bits(
+    mask: np.ndarray, row_index: np.ndarray, column_index: np.ndarray
+) -> np.ndarray:
+    """
+    Pack a mask of the padded grid into one bit per cell, 64 cells per 64 bit word,
+    in the same order of cells as the packed grid
+    :param mask: per cell of the padded grid, whether the bit is set
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :return: a flat array of words
+    """
+    n_cells = row_index[-1] + column_index[-1] + 1
+    bits = np.zeros((n_cells + 63) // 64, dtype=np.uint64)
+    for x in range(mask.shape[0]):
+        for y in range(mask.shape[1]):
+            if mask[x, y]:
+                set_packed_bit(bits, row_index, column_index, x, y, True)
+    return bits
+
+
+@njit(cache=True)
+def set_packed_bit(
+    bits: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    x: int,
+    y: int,
+    value: bool,
+):
+    """
+    Set or clear the bit of one cell in an array packed by pack_bits
+    :param bits: the packed bits
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param x: the row of the cell in the padded grid
+    :param y: the column of the cell in the padded grid
+    :param value: whether to set the bit
+    """
+    index = row_index[x] + column_index[y]
+    bit = np.uint64(1) << np.uint64(index % 64)
+    if value:
+        bits[index // 64] |= bit
     else:
-        os.system("clear")
+        bits[index // 64] &= ~bit
+
+
+@njit(cache=True)
+def get_packed_bit(
+    bits: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    x: int,
+    y: int,
+) -> bool:
+    """
+    Get the bit of one cell of an array packed by pack_bits
+    :param bits: the packed bits
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param x: the row of the cell in the padded grid
+    :param y: the column of the cell in the padded grid
+    :return: whether the bit is set
+    """
+    index = row_index[x] + column_index[y]
+    return (bits[index // 64] >> np.uint64(index % 64)) & np.uint64(1) == 1
+
+
+@njit(cache=True)
+def set_packed_cell(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    x: int,
+    y: int,
+    code: int,
+):
+    """
+    Overwrite the two bits of one cell in the packed grid
+    :param packed_grid: the packed padded grid
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param x: the row of the cell in the padded grid
+    :param y: the column of the cell in the padded grid
+    :param code: the integer code of the new cell state
+    """
+    index = row_index[x] + column_index[y]
+    shift = np.uint64(2 * (index % 32))
+    cleared = packed_grid[index // 32] & ~(np.uint64(3) << shift)
+    packed_grid[index // 32] = cleared | (np.uint64(code) << shift)
+
+
+@njit(cache=True)
+def get_packed_cell(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    x: int,
+    y: int,
+) -> int:
+    """
+    Get the two bits of one cell of the packed grid
+    :param packed_grid: the packed padded grid
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param x: the row of the cell in the padded grid
+    :param y: the column of the cell in the padded grid
+    :return: the integer code of the cell state
+    """
+    index = row_index[x] + column_index[y]
+    shift = np.uint64(2 * (index % 32))
+    return int((packed_grid[index // 32] >> shift) & np.uint64(3))
+
+
+@njit(cache=True)
+def popcount(value: int) -> int:
+    """
+    Count the set bits of a non-negative 32 bit value without branching
+    :param value: the value whose bits are counted
+    :return: the number of set bits
+    """
+    value = value - ((value >> 1) & 0x55555555)
+    value = (value & 0x33333333) + ((value >> 2) & 0x33333333)
+    value = (value + (value >> 4)) & 0x0F0F0F0F
+    return ((value * 0x01010101) & 0xFFFFFFFF) >> 24
+
+
+@njit(cache=True)
+def count_packed_neighbors(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    x: int,
+    y: int,
+):
+    """
+    Count the occurrence of As and Bs in the direct neighborhood of a cell
+    by packing the three by three window into one integer
+    :param packed_grid: the packed padded grid
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param x: the row of the cell in the padded grid
+    :param y: the column of the cell in the padded grid
+    :return: a tuple with the count of each A and B neighbors
+    """
+    window = 0
+    for i in range(3):
+        for j in range(3):
+            code = get_packed_cell(
+                packed_grid, row_index, column_index, x - 1 + i, y - 1 + j
+            )
+            window |= code << (6 * i + 2 * j)
+    window &= WINDOW_NEIGHBOR_BITS
+    low = window & WINDOW_LOW_BITS
+    high = (window & WINDOW_HIGH_BITS) >> 1
+
+    # A is 01 and B is 10, border cells are 11 and set both bits
+    return popcount(low & ~high), popcount(high & ~low)
+
+
+def get_min_equal_neighbors(stay_threshold: float) -> np.ndarray:
+    """
+    For each number of neighbors, calculate the least number of equal neighbors
+    to stay, i.e., the smallest count whose share reaches the threshold.
+    This avoids calculating the share for every agent. No neighbors at all means staying.
+    :param stay_threshold: fraction of equal neighbors to not move
+    :return: an array with the least number of equal neighbors for zero to eight neighbors
+    """
+    min_equals = np.zeros(9, dtype=np.int64)
+    for n_neighbors in range(1, 9):
+        while (
+            min_equals[n_neighbors] < n_neighbors
+            and min_equals[n_neighbors] / n_neighbors < stay_threshold
+        ):
+            min_equals[n_neighbors] += 1
+    return min_equals
+
+
+@njit(cache=True)
+def update_happiness(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    happy: np.ndarray,
+    min_equals: np.ndarray,
+    x: int,
+    y: int,
+    happy_count: int,
+) -> int:
+    """
+    Recalculate whether the agents in the three by three window around a cell are
+    happy, i.e., have enough equal neighbors to stay. Only these agents are affected
+    when the cell changes.
+    :param packed_grid: the padded grid packed into two bits per cell
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param happy: one bit per cell of the padded grid in the order of the packed grid,
+        whether an agent is located there and happy
+    :param min_equals: the least number of equal neighbors to stay per number of neighbors
+    :param x: the row of the changed cell in the padded grid
+    :param y: the column of the changed cell in the padded grid
+    :param happy_count: the number of happy agents before the update
+    :return: the number of happy agents after the update
+    """
+    for i in range(x - 1, x + 2):
+        for j in range(y - 1, y + 2):
+            cell = get_packed_cell(packed_grid, row_index, column_index, i, j)
+            is_happy = False
+            if cell == AGENT_A or cell == AGENT_B:
+                a_count, b_count = count_packed_neighbors(
+                    packed_grid, row_index, column_index, i, j
+                )
+                equals = a_count if cell == AGENT_A else b_count
+                is_happy = equals >= min_equals[a_count + b_count]
+            if is_happy != get_packed_bit(happy, row_index, column_index, i, j):
+                set_packed_bit(happy, row_index, column_index, i, j, is_happy)
+                happy_count += 1 if is_happy else -1
+    return happy_count
+
+
+@njit(cache=True)
+def run_schelling_steps(
+    packed_grid: np.ndarray,
+    row_index: np.ndarray,
+    column_index: np.ndarray,
+    occupied: np.ndarray,
+    empty: np.ndarray,
+    happy: np.ndarray,
+    min_equals: np.ndarray,
+    happy_count: int,
+    agent_draws: np.ndarray,
+    slot_draws: np.ndarray,
+    segregation_shares: np.ndarray,
+) -> int:
+    """
+    Run steps of the Schelling segregation model, i.e., repeatedly choose one agent
+    and have it move if its neighbor share is below the stay threshold.
+    All arrays are updated in place.
+    :param packed_grid: the padded grid packed into two bits per cell
+    :param row_index: the index of each row in the packed grid
+    :param column_index: the index of each column in the packed grid
+    :param occupied: flat grid indices of all agents
+    :param empty: flat grid indices of all empty cells
+    :param happy: one bit per cell of the padded grid in the order of the packed grid,
+        whether an agent is located there and happy
+    :param min_equals: the least number of equal neighbors to stay per number of neighbors
+    :param happy_count: the number of happy agents before the first step
+    :param agent_draws: the random index in occupied of the chosen agent of each step
+    :param slot_draws: the random slot in empty of the new cell of each step
+    :param segregation_shares: receives the share of happy agents after each step,
+        its length is the number of steps to run
+    :return: the number of happy agents after the last step
+    """
+    y_size = column_index.shape[0] - 2
+    n_agents = occupied.shape[0]
+
+    for step in range(segregation_shares.shape[0]):
+        # randomly select an agent
+        agent_index = agent_draws[step]
+        old_flat = occupied[agent_index]
+        x, y = divmod(old_flat, y_size)
+        cell = get_packed_cell(packed_grid, row_index, column_index, x + 1, y + 1)
+
+        # count As and Bs among the direct neighbors in the padded grid
+        a_count, b_count = count_packed_neighbors(
+            packed_grid, row_index, column_index, x + 1, y + 1
+        )
+        equals = a_count if cell == AGENT_A else b_count
+
+        # move to random new position if share of equal neighbors is smaller than threshold.
+        if equals < min_equals[a_count + b_count]:
+            slot = slot_draws[step]
+            new_flat = empty[slot]
+            new_x, new_y = divmod(new_flat, y_size)
+            set_packed_cell(
+                packed_grid, row_index, column_index, new_x + 1, new_y + 1, cell
+            )
+            set_packed_cell(packed_grid, row_index, column_index, x + 1, y + 1, EMPTY)
+
+            # keep track of the agent's new location, its old cell takes the slot of the new one
+            occupied[agent_index] = new_flat
+            empty[slot] = old_flat
+
+            # only agents around the old and the new cell can change their happiness
+            happy_count = update_happiness(
+                packed_grid,
+                row_index,
+                column_index,
+                happy,
+                min_equals,
+                x + 1,
+                y + 1,
+                happy_count,
+            )
+            happy_count = update_happiness(
+                packed_grid,
+                row_index,
+                column_index,
+                happy,
+                min_equals,
+                new_x + 1,
+                new_y + 1,
+                happy_count,
+            )
+
+        segregation_shares[step] = happy_count / n_agents
+
+    return happy_count
+
+
+def run_seeded_model(
+    model_class: type, params: dict, seed: int, steps: int
+) -> np.ndarray:
+    """
+    Initialize a Schelling model with a given seed and run it without printing
+    :param model_class: the SchellingModel class or a subclass of it to initialize
+    :param params: the keyword arguments to initialize the model with
+    :param seed: the seed of the random number generator
+    :param steps: How many agents consecutively decide whether to move or not
+    :return: the segregation shares after every step
+    """
+    model = model_class(**params, seed=seed)
+    model.run(steps=steps, print_at_end=False)
+    return model.segregation_shares
+
+
+# whether enable_ansi_escape_codes already ran
+ansi_escape_codes_enabled = False
+
+
+def enable_ansi_escape_codes():
+    """
+    Let the Windows console interpret ANSI escape codes
+    for colors and clearing, other terminals always do.
+    Only changes the console mode the first time it is called.
+    """
+    global ansi_escape_codes_enabled
+    if ansi_escape_codes_enabled:
+        return
+    ansi_escape_codes_enabled = True
+
+    if platform.system() == "Windows":
+        kernel32 = ctypes.windll.kernel32
+        # the handle of the standard output
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_ulong()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # add ENABLE_VIRTUAL_TERMINAL_PROCESSING to the console mode
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+
+
+def clear_output():
+    """
+    Clear the former output to not spam the console.
+    Moves the cursor home and clears the screen with ANSI escape codes
+    instead of starting a cls or clear process.
+    """
+    enable_ansi_escape_codes()
+    sys.stdout.write("\x1b[H\x1b[2J")
+    sys.stdout.flush()
 
 
 class SchellingModel:
@@ -24,6 +504,7 @@ class SchellingModel:
         n_agents: int,
         share_a: float,
         stay_threshold: float,
+        seed: Optional[int] = None,
     ):
         """
         calculates a schelling segregation simulation show the emergence of segregation
@@ -36,21 +517,44 @@ class SchellingModel:
         :param n_agents: number of total agents (A and B)
         :param share_a: share of type a agents
         :param stay_threshold: fraction of equal neighbors to not move
+        :param seed: seed of the random number generator to reproduce a run
         :return: the schelling grid
         """
 
+        # the random number generator for placing agents and choosing agents and cells
+        self.rng = np.random.default_rng(seed)
+
         self.x_size = int(grid_size[0])
         self.y_size = int(grid_size[1])
         self.n_agents = int(n_agents)
         self.share_a = float(share_a)
         self.stay_threshold = float(stay_threshold)
+        # the least number of equal neighbors to stay per number of neighbors
+        self.min_equals = get_min_equal_neighbors(self.stay_threshold)
 
-        # the grid in which agents are located (will be initialized later)
+        # the grid in which agents are located (will be initialized later),
+        # only updated from packed_grid at the end of run and before printing
         self.grid = None
+        # the grid surrounded by a one cell wide border, grid is a view of its inside
+        self.padded_grid = None
+        # the padded grid with two bits per cell, updated by run_schelling_steps
+        self.packed_grid = None
+        # the index of each row and each column of the padded grid in the packed grid
+        self.packed_row_index = None
+        self.packed_column_index = None
+        # flat grid indices of all agents (will be initialized later)
+        self.occupied = None
+        # flat grid indices of all empty cells (will be initialized later)
+        self.empty = None
         # the share of agents with more than stay_threshold * 100 percent neighbors of the same letter
-        self.segregation_shares = []
+        self.segregation_shares = np.empty(0, dtype=np.float32)
         # how often a random agent decided whether to move or not
         self.steps_run = 0
+        # one bit per cell of the padded grid in the order of the packed grid, whether an
+        # agent is located there and happy, i.e., would not move if selected,
+        # and the number of happy agents
+        self.happy = None
+        self.happy_count = 0
 
         # check whether inputs were valid
         self.__check_inputs()
@@ -86,16 +590,71 @@ class SchellingModel:
         randomly fill it with agents of type a and b
         """
 
-        # initialize two-dimensional grid
-        self.grid = [self.y_size * [None] for x in range(self.x_size)]
-
-        # randomly place 50% A-agents and 50% B-agents in grid
-        for i in range(math.floor(self.n_agents / 2)):
-            new_pos = self.__find_empty_cell()
-            self.grid[new_pos[0]][new_pos[1]] = "A"
-        for j in range(math.ceil(self.n_agents)):
-            new_pos = self.__find_empty_cell()
-            self.grid[new_pos[0]][new_pos[1]] = "B"
+        # initialize two-dimensional grid, one byte per cell, padded with border cells
+        # so that the three by three neighborhood of each cell lies within the array
+        self.padded_grid = np.full(
+            (self.x_size + 2, self.y_size + 2), BORDER, dtype=np.int8
+        )
+        self.grid = self.padded_grid[1:-1, 1:-1]
+        self.grid[:] = EMPTY
+        # all cells start out empty
+        self.empty = np.arange(self.x_size * self.y_size, dtype=np.int32)
+
+        # randomly place share_a A-agents and the remaining B-agents in grid,
+        # drawing all slots at once while the list of empty cells shrinks by one per agent
+        n_agents_a = round(self.n_agents * self.share_a)
+        slots = self.rng.integers(0, len(self.empty) - np.arange(self.n_agents))
+        for i, slot in enumerate(slots):
+            new_x_pos, new_y_pos = divmod(int(self.empty[slot]), self.y_size)
+            self.grid[new_x_pos, new_y_pos] = AGENT_A if i < n_agents_a else AGENT_B
+            self.__remove_empty_cell(slot)
+
+        # pack the grid to count neighbors with bit operations
+        self.packed_row_index, self.packed_column_index = get_packed_layout(
+            *self.padded_grid.shape
+        )
+        self.packed_grid = pack_grid(
+            self.padded_grid, self.packed_row_index, self.packed_column_index
+        )
+
+        # flat indices of all occupied cells, one entry per agent
+        self.occupied = np.flatnonzero(self.grid.ravel()).astype(np.int32)
+
+        # calculate which agents are happy in the initial state
+        self.__initialize_happiness()
+
+    @classmethod
+    def run_ensemble(
+        cls,
+        params: dict,
+        n_runs: int,
+        steps: int,
+        seeds: Optional[List[int]] = None,
+        n_workers: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Run several independent Schelling models of this class with different seeds
+        in parallel processes, e.g., to average the segregation over many runs.
+        :param params: the keyword arguments to initialize each model with
+        :param n_runs: how many models to run
+        :param steps: How many agents consecutively decide whether to move or not in each model
+        :param seeds: the seed of each model, by default 0 to n_runs - 1
+        :param n_workers: how many processes to use, by default one per processor
+        :return: the segregation shares of each run after every step, one row per run
+        """
+        if seeds is None:
+            seeds = list(range(n_runs))
+        assert len(seeds) == n_runs, "There must be exactly one seed per run."
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            segregation_shares = executor.map(
+                run_seeded_model,
+                [cls] * n_runs,
+                [params] * n_runs,
+                seeds,
+                [steps] * n_runs,
+            )
+            return np.stack(list(segregation_shares))
 
     def run(self, steps: int = 1000, print_at_end: bool = True, print_every: int = 0):
         """
@@ -106,152 +665,93 @@ class SchellingModel:
             To not print an update, set to -1 or larger than steps
         """
 
-        for step in range(steps):
-            # let one agent decide whether to move or not and update the grid
-            self.__run_one_step()
-            # update step counter
-            self.steps_run += 1
-            # track current state of separation
-            self.segregation_shares.append(self.get_segregation())
-
-            # check whether it is time to print an update and do so
-            if self.steps_run % print_every == 0:
-                clear_output()
-                self.print_schelling()
+        # make room for the segregation shares of the new steps
+        segregation_shares = np.empty(self.steps_run + steps, dtype=np.float32)
+        segregation_shares[: self.steps_run] = self.segregation_shares
+        self.segregation_shares = segregation_shares
+
+        # decide once whether to print updates, as documented, not if print_every
+        # is not positive or larger than steps
+        do_print = 0 < print_every <= steps
+
+        steps_left = steps
+        if not do_print:
+            # run the steps in batches without checking for printing at all
+            while steps_left > 0:
+                batch_size = min(STEP_BATCH_SIZE, steps_left)
+                self.__run_batch(batch_size)
+                steps_left -= batch_size
+        else:
+            # end the batches at each multiple of print_every to print the update
+            while steps_left > 0:
+                batch_size = min(
+                    STEP_BATCH_SIZE,
+                    steps_left,
+                    print_every - self.steps_run % print_every,
+                )
+                self.__run_batch(batch_size)
+                steps_left -= batch_size
+
+                if self.steps_run % print_every == 0:
+                    self.__unpack_grid()
+                    clear_output()
+                    self.print_schelling()
+
+        # bring the grid up to date with the steps run
+        self.__unpack_grid()
 
         # check whether to print the final state and do so
         if print_at_end:
             clear_output()
             self.print_schelling()
 
-    def __run_one_step(self):
+    def __run_batch(self, batch_size: int):
         """
-        Run one step of the Schelling segregation model,
-        i.e., choose one agent and have it move if
-        its neighbor share is below the stay threshold
+        Run a batch of steps of the Schelling segregation model in compiled code
+        and track the state of separation after every step
+        :param batch_size: How many agents consecutively decide whether to move or not
         """
-        # randomly select an agent
-        chosen_agent = self.__find_full_cell()
-        # calculate share of equal neighbors
-        equals = self.__get_neighbor_relation(chosen_agent)
-
-        # move to random new position if share is smaller than threshold.
-        if equals < self.stay_threshold:
-            new_pos = self.__find_empty_cell()
-            self.grid[new_pos[0]][new_pos[1]] = self.grid[chosen_agent[0]][
-                chosen_agent[1]
-            ]
-            self.grid[chosen_agent[0]][chosen_agent[1]] = None
-
-    def __find_empty_cell(self) -> Tuple[int, int]:
+        # draw the random agents and cells of the batch at once, the number
+        # of empty cells does not change anymore
+        agent_draws = self.rng.integers(0, self.n_agents, size=batch_size)
+        slot_draws = self.rng.integers(0, len(self.empty), size=batch_size)
+
+        # let one agent after another decide whether to move or not and update the grid
+        self.happy_count = run_schelling_steps(
+            self.packed_grid,
+            self.packed_row_index,
+            self.packed_column_index,
+            self.occupied,
+            self.empty,
+            self.happy,
+            self.min_equals,
+            self.happy_count,
+            agent_draws,
+            slot_draws,
+            self.segregation_shares[self.steps_run : self.steps_run + batch_size],
+        )
+        # update step counter
+        self.steps_run += batch_size
+
+    def __unpack_grid(self):
         """
-        finds an empty cell in the schelling grid and returns its location.
-        :return: a tuple of x and y location of the cell
+        Update the grid from the packed grid, which is the only one the steps change
         """
-
-        # randomly pick position
-        new_x_pos = random.randint(0, len(self.grid) - 1)
-        new_y_pos = random.randint(0, len(self.grid[0]) - 1)
-
-        # if cell is occupied, retry until it is not
-        while self.grid[new_x_pos][new_y_pos]:
-            new_x_pos = random.randint(0, len(self.grid) - 1)
-            new_y_pos = random.randint(0, len(self.grid[0]) - 1)
-
-        # return position of empty cell
-        return new_x_pos, new_y_pos
-
-    def __find_full_cell(self) -> Tuple[int, int]:
+        unpack_grid(
+            self.packed_grid,
+            self.packed_row_index,
+            self.packed_column_index,
+            self.padded_grid,
+        )
+
+    def __remove_empty_cell(self, slot: int):
         """
-        finds a full cell in the schelling grid and returns its location.
-        :return: a tuple of x and y location of the cell
+        removes a cell from the list of empty cells by moving the last
+        empty cell into its slot and shortening the list by one
+        :param slot: the slot of the cell in empty
         """
-
-        # randomly pick position
-        full_cell = False
-
-        # if cell is empty, retry until it is not
-        while not full_cell:
-            new_x_pos = random.randint(0, self.x_size - 1)
-            new_y_pos = random.randint(0, self.y_size - 1)
-            if self.grid[new_x_pos][new_y_pos]:
-                full_cell = True
-
-        # return position of occupied cell
-        return new_x_pos, new_y_pos
-
-    def __get_neighbor_relation(self, position) -> float:
-        """
-        calculates the share of equal direct neighbors of an agent in the
-        schelling grid at a given position
-        :param position: a tuple of x and y location of the agent
-        :return: the share of neighbors of the same letter
-        """
-        a_count, b_count = self.__count_neighbors(position=position)
-
-        # return the share of equal neighbors given the value of the agent
-        if self.grid[position[0]][position[1]] == "A":
-            if b_count == 0:
-                neighbor_relation = 1
-            else:
-                neighbor_relation = a_count / b_count
-        elif self.grid[position[0]][position[1]] == "B":
-            if a_count == 0:
-                neighbor_relation = 1
-            else:
-                neighbor_relation = b_count / a_count
-        # no neighbors: stay
-        else:
-            return 1.0
-
-        return neighbor_relation
-
-    def __get_neighbor_positions(
-        self, position: Tuple[int, int]
-    ) -> List[Tuple[int, int]]:
-        """
-        Get a list of all neighbor tuple locations
-        to avoid index errors or empty cells
-        :param position: the location of the agent whose neighbors are wanted
-        :return: a list with all neighbor tuple locations
-        """
-        # start a list of neighbors
-        neighbors = []
-
-        # check all positions in the three by three grid surrounding the given position
-        # whether they exist and exclude the original position as well
-        for i in range(-1, 2):
-            x = position[0] + i
-            for j in range(-1, 2):
-                y = position[1] + j
-                if 0 <= x < self.x_size and 0 <= y < self.y_size and (x, y) != position:
-                    neighbors.append((x, y))
-
-        return neighbors
-
-    def __count_neighbors(self, position: Tuple[int, int]) -> Tuple[int, int]:
-        """
-        Count the occurrence of As and Bs in an agents direct neighborhood
-        :param position: the location of the agent whose neighbors are wanted
-        :return: a tuple with the count of each A and B neighbors
-        """
-        # calculate the neighbor boundaries to correctly capture agents at the border
-
-        # initialize counters
-        a_count = 0
-        b_count = 0
-
-        # find the location of all neighbors
-        neighbors = self.__get_neighbor_positions(position=position)
-
-        # iterate over all neighbors and count As and Bs
-        for x, y in neighbors:
-            if self.grid[x][y] == "A":
-                a_count += 1
-            elif self.grid[x][y] == "B":
-                b_count += 1
-
-        return a_count, b_count
+        self.empty[slot] = self.empty[-1]
+        self.empty = self.empty[:-1]
 
     def print_schelling(self):
         """
@@ -259,30 +759,17 @@ class SchellingModel:
         Agents will be highlighted in different colors and
         the grid will be visualized in a checkboard pattern
         """
-        # get the colors and bold font for each agent type and empty cells
-        print_values = {
-            "A": f"{Colors.bold}{Colors.fg.green} A {Colors.reset}",
-            "B": f"{Colors.bold}{Colors.fg.blue} B {Colors.reset}",
-            None: f"   {Colors.reset}",
-        }
-
-        # replace each grid value with a colored print version
-        print_grid = [
-            [f"{print_values[cell_value]}" for cell_value in row] for row in self.grid
-        ]
-        # add light grey as every second background colors to help visualize grid
-        print_grid = [
-            [
-                f"{Colors.bg.lightgrey}{cell}"
-                if ((i % 2 == 0 and j % 2 == 0) or (i % 2 == 1 and j % 2 == 1))
-                else cell
-                for j, cell in enumerate(row)
-            ]
-            for i, row in enumerate(print_grid)
-        ]
+        # the colors are ANSI escape codes as well
+        enable_ansi_escape_codes()
+
+        # pick the colored print version of each cell by its background and value
+        x_idx = np.arange(self.x_size)
+        y_idx = np.arange(self.y_size)
+        background = (x_idx[:, None] + y_idx[None, :]) & 1
+        print_cells = PRINT_TOKENS[background, self.grid]
 
         # create one printable string
-        print_grid = "\n".join(["".join(row) for row in print_grid])
+        print_grid = "\n".join(["".join(row) for row in print_cells])
 
         # actually print grid
         print(print_grid)
@@ -293,20 +780,34 @@ class SchellingModel:
         at least stay_threshold * 100 percent of equal letters as neighbors
         :return: fraction of happy agents
         """
+        return self.happy_count / self.n_agents
 
-        # staying means the agent has >= stay_threshold equal-letter neighbors
-        staying = 0
-        # check for each agent and skip empty cells
-        for i in range(len(self.grid)):
-            for j in range(len(self.grid[0])):
-                if self.grid[i][j] is not None:
-                    # return the share of same letters in neighborhood
-                    neighbor_relation = self.__get_neighbor_relation(position=(i, j))
-                    # compare to threshold and
-                    if neighbor_relation >= self.stay_threshold:
-                        staying += 1
-
-        return staying / self.n_agents
+    def __initialize_happiness(self):
+        """
+        calculate for all cells of the grid at once whether an agent
+        is located there and happy and count the happy agents
+        """
+        is_a = self.grid == AGENT_A
+        is_b = self.grid == AGENT_B
+
+        # count the A and B neighbors of every cell, border cells are neither
+        a_counts = convolve2d(
+            (self.padded_grid == AGENT_A).astype(np.int8), NEIGHBOR_KERNEL, mode="valid"
+        )
+        b_counts = convolve2d(
+            (self.padded_grid == AGENT_B).astype(np.int8), NEIGHBOR_KERNEL, mode="valid"
+        )
+
+        # same as run_schelling_steps: compare to the least number of equal neighbors
+        same = np.where(is_a, a_counts, b_counts)
+        staying = (is_a | is_b) & (same >= self.min_equals[a_counts + b_counts])
+
+        padded_staying = np.zeros(self.padded_grid.shape, dtype=np.bool_)
+        padded_staying[1:-1, 1:-1] = staying
+        self.happy = pack_bits(
+            padded_staying, self.packed_row_index, self.packed_column_index
+        )
+        self.happy_count = int(staying.sum())
 
     def plot_segregation_curve(self):
         """
@@ -316,7 +817,7 @@ class SchellingModel:
         """
 
         # plot the steps run and the segregation shares and add lables and title
-        plt.plot(list(range(self.steps_run)), self.segregation_shares)
+        plt.plot(np.arange(self.steps_run), self.segregation_shares)
         plt.xlabel("# steps run")
         plt.ylabel("homogeneity")
         plt.title("Schelling segregation model time series")